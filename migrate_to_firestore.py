@@ -100,6 +100,9 @@ def migrate_json_to_firestore():
         print(f"💾 Committing final batch ({batch_count} operations)...")
         batch.commit()
     
+    # The server's materialized dashboard (if enabled) is rebuilt on the next read
+    db.collection('dashboard').document('meta').delete()
+    
     print(f"🎉 Migration completed successfully!")
     print(f"   📂 Categories: {len(categories_data)}")
     print(f"   📝 Tasks: {total_tasks}")
@@ -8,18 +8,327 @@ Uses Google Cloud Firestore for persistent data storage
 
 import http.server
 import socketserver
+import socket
 import webbrowser
 import os
+import re
+import sys
 import json
+import time
+import signal
+import threading
+import multiprocessing
 import urllib.parse
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 # Google Cloud Firestore
 from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.api_core.exceptions import AlreadyExists, NotFound
 
 # Use PORT environment variable if available (for Cloud Run), otherwise default to 8081
 PORT = int(os.environ.get('PORT', 8081))
 CONFIG_FILE = "tasks-config.json"  # For initial migration only
+# Number of prefork worker processes sharing PORT (1 = single process, no supervisor)
+WORKERS = int(os.environ.get('WORKERS', 1))
+# A worker exiting sooner than this after start counts as a startup failure
+WORKER_MIN_UPTIME_SECONDS = 10
+# Consecutive startup failures of one worker before the supervisor gives up
+WORKER_MAX_RAPID_FAILURES = 5
+
+# Archival of finished tasks out of the 'tasks' working set
+TERMINAL_STATUSES = ['Closed', 'Closed-Hide']
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 30))
+# How often the background archive job runs; archiving moves data, so it is off (0) unless set
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 0))
+# Tasks per batch commit; each task is two writes, Firestore allows 500 per batch
+ARCHIVE_BATCH_SIZE = 200
+# Serve /api/categories from a precomputed 'dashboard' document kept up to date on every write
+MATERIALIZED_DASHBOARD = os.environ.get('MATERIALIZED_DASHBOARD', '').lower() in ('1', 'true', 'yes')
+# Split the dashboard document before it nears Firestore's 1 MiB document limit
+DASHBOARD_SHARD_BYTES = 900 * 1024
+# IDs tried when concurrent adds race for the next task ID
+ADD_TASK_MAX_ATTEMPTS = 10
+# How long a request waits on another request's identical in-flight read
+COALESCE_TIMEOUT_SECONDS = float(os.environ.get('COALESCE_TIMEOUT_SECONDS', 30))
+
+class SingleFlight:
+    """Share one in-progress call among concurrent callers using the same key"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, timeout=COALESCE_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        # Bumped on every write; only writes made through this instance are seen
+        self._generation = 0
+        # multiprocessing.Value shared by prefork workers, so a write in one reaches all
+        self._shared_generation = None
+
+    def share_generation(self, value):
+        """Use a multiprocessing.Value as the write generation shared with other processes"""
+        self._shared_generation = value
+
+    def generation(self):
+        if self._shared_generation is not None:
+            return self._shared_generation.value
+        return self._generation
+
+    def invalidate(self):
+        """Stop new callers on this instance from joining reads that started before a write"""
+        if self._shared_generation is not None:
+            with self._shared_generation.get_lock():
+                self._shared_generation.value += 1
+            return
+        with self._lock:
+            self._generation += 1
+
+    def _forget(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def do(self, key, fn, timeout=None):
+        """Run fn once for all concurrent callers of key and return (or raise) its outcome"""
+        with self._lock:
+            # Reads started before the latest write on this instance are keyed under an older generation
+            key = (key, self.generation())
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                # Later callers start a fresh fetch instead of reusing this result
+                self._forget(key, call)
+                call.done.set()
+        elif not call.done.wait(self.timeout if timeout is None else timeout):
+            # Don't let a hung leader hold the key; the next caller starts a fresh fetch
+            self._forget(key, call)
+            raise TimeoutError(f"Timed out waiting for in-flight read '{key[0]}'")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+# Coalesces identical concurrent Firestore reads within this process (or instance, when preforking)
+inflight_reads = SingleFlight()
+
+# Fields stored on task documents that are not part of the API payload
+TIMESTAMP_FIELDS = ('created_at', 'updated_at', 'closed_at', 'archived_at')
+
+def task_from_doc(task_doc):
+    """Convert a task document to a JSON-serializable dict"""
+    task_data = task_doc.to_dict()
+    task_data['id'] = int(task_doc.id)  # Ensure ID is integer
+    
+    # Remove Firestore timestamps that can't be JSON serialized
+    for field in TIMESTAMP_FIELDS:
+        task_data.pop(field, None)
+    return task_data
+
+def fetch_categories(db, transaction=None):
+    """Read all categories and tasks from Firestore and group tasks by category"""
+    print("Getting categories from Firestore...")
+    categories = {}
+    
+    # Get all categories with timeout protection
+    categories_ref = db.collection('categories')
+    category_docs = list(categories_ref.stream(transaction=transaction))
+    print(f"Found {len(category_docs)} categories")
+    
+    # Get all tasks at once (more efficient)
+    tasks_ref = db.collection('tasks')
+    all_task_docs = list(tasks_ref.stream(transaction=transaction))
+    print(f"Found {len(all_task_docs)} tasks")
+    
+    # Group tasks by category
+    tasks_by_category = {}
+    for task_doc in all_task_docs:
+        task_data = task_from_doc(task_doc)
+    
+        category = task_data.get('category', 'Unknown')
+    
+        if category not in tasks_by_category:
+            tasks_by_category[category] = []
+        tasks_by_category[category].append(task_data)
+    
+    # Build categories structure
+    for category_doc in category_docs:
+        category_data = category_doc.to_dict()
+        category_name = category_doc.id
+    
+        # Get tasks for this category
+        tasks = tasks_by_category.get(category_name, [])
+    
+        # Sort tasks by ID
+        tasks.sort(key=lambda x: x.get('id', 0))
+    
+        categories[category_name] = {
+            'color': category_data.get('color', '#666666'),
+            'tasks': tasks
+        }
+    
+    print(f"Successfully built {len(categories)} categories")
+    return categories
+
+def json_size(value):
+    """Size of value encoded as UTF-8 JSON, used to estimate Firestore document size"""
+    return len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+def split_dashboard(categories):
+    """Pack categories into shard lists that each stay under DASHBOARD_SHARD_BYTES"""
+    shards = []
+    current = []
+    size = 2  # Enclosing brackets of the shard list
+    
+    def start_shard():
+        nonlocal current, size
+        if current:
+            shards.append(current)
+        current = []
+        size = 2
+    
+    for name, data in categories.items():
+        color = data.get('color', '#666666')
+        # Entry with no tasks, plus the ", " separating it from the previous entry
+        header_size = json_size({'name': name, 'color': color, 'tasks': []}) + 2
+        if current and size + header_size > DASHBOARD_SHARD_BYTES:
+            start_shard()
+        entry = {'name': name, 'color': color, 'tasks': []}
+        current.append(entry)
+        size += header_size
+        
+        for task in data.get('tasks', []):
+            task_size = json_size(task) + 2
+            if 2 + header_size + task_size > DASHBOARD_SHARD_BYTES:
+                raise ValueError(f"Task {task.get('id')} is too large to store in the dashboard document")
+            if size + task_size > DASHBOARD_SHARD_BYTES:
+                # Continue this category in a new shard; drop the header if it has no tasks yet
+                if not entry['tasks']:
+                    current.pop()
+                start_shard()
+                entry = {'name': name, 'color': color, 'tasks': []}
+                current.append(entry)
+                size += header_size
+            entry['tasks'].append(task)
+            size += task_size
+    
+    start_shard()
+    return shards or [[]]
+
+def read_dashboard(db, transaction=None):
+    """Read the materialized dashboard; returns (categories, shards) or (None, [])"""
+    # One query so the meta document and shards come from the same snapshot
+    docs = {doc.id: doc.to_dict() for doc in db.collection('dashboard').stream(transaction=transaction)}
+    meta = docs.get('meta')
+    if meta is None:
+        return None, []
+    
+    shards = [docs.get(f'shard_{i}', {}).get('categories', []) for i in range(meta.get('shards', 0))]
+    
+    categories = {}
+    for shard in shards:
+        for entry in shard:
+            category = categories.setdefault(entry['name'], {'color': entry['color'], 'tasks': []})
+            category['tasks'].extend(entry['tasks'])
+    return categories, shards
+
+def write_dashboard(db, writer, categories, old_shards):
+    """Write changed dashboard shards with a transaction or batch"""
+    dashboard_ref = db.collection('dashboard')
+    shards = split_dashboard(categories)
+    
+    for i, shard in enumerate(shards):
+        if i >= len(old_shards) or shard != old_shards[i]:
+            writer.set(dashboard_ref.document(f'shard_{i}'), {'categories': shard})
+    for i in range(len(shards), len(old_shards)):
+        writer.delete(dashboard_ref.document(f'shard_{i}'))
+    
+    writer.set(dashboard_ref.document('meta'), {
+        'shards': len(shards),
+        'updated_at': firestore.SERVER_TIMESTAMP
+    })
+
+def rebuild_dashboard(db):
+    """Rebuild the materialized dashboard from the categories and tasks collections"""
+    @firestore.transactional
+    def rebuild(transaction):
+        old_shards = read_dashboard(db, transaction)[1]
+        categories = fetch_categories(db, transaction)
+        write_dashboard(db, transaction, categories, old_shards)
+        return categories
+    
+    categories = rebuild(db.transaction())
+    print(f"Rebuilt dashboard document with {len(categories)} categories")
+    return categories
+
+def reset_dashboard(db):
+    """Drop the materialized dashboard after writes that bypass it so the next read rebuilds it"""
+    db.collection('dashboard').document('meta').delete()
+    inflight_reads.invalidate()
+
+def write_task(db, task_ref, set_data=None, update_data=None, delete=False, color='#666666'):
+    """Write a task document, keeping the materialized dashboard in the same transaction"""
+    # New tasks are created, never overwritten: AlreadyExists is raised if the ID is taken
+    if not MATERIALIZED_DASHBOARD:
+        if delete:
+            task_ref.delete()
+        elif update_data is not None:
+            task_ref.update(update_data)
+        else:
+            task_ref.create(set_data)
+        # Any dashboard document left from materialized mode is now stale; the next read in that mode rebuilds it
+        reset_dashboard(db)
+        return
+    
+    @firestore.transactional
+    def apply(transaction):
+        # Firestore transactions need every read before the first write
+        categories, old_shards = read_dashboard(db, transaction)
+        task = None
+        if delete:
+            transaction.delete(task_ref)
+        elif update_data is not None:
+            task_doc = task_ref.get(transaction=transaction)
+            # Deleted or archived since the handler checked; same error update() raises
+            if not task_doc.exists:
+                raise NotFound(f"Task {task_ref.id} not found")
+            task = task_from_doc(task_doc)
+            task.update({k: v for k, v in update_data.items() if k not in TIMESTAMP_FIELDS})
+            transaction.update(task_ref, update_data)
+        else:
+            task = {k: v for k, v in set_data.items() if k not in TIMESTAMP_FIELDS}
+            task['id'] = int(task_ref.id)
+            transaction.create(task_ref, set_data)
+        
+        # Without a dashboard document yet, the next read rebuilds it
+        if categories is None:
+            return
+        
+        task_id = int(task_ref.id)
+        for category in categories.values():
+            category['tasks'] = [t for t in category['tasks'] if t.get('id') != task_id]
+        if task is not None:
+            category = categories.setdefault(task.get('category', 'Unknown'), {'color': color, 'tasks': []})
+            category['tasks'].append(task)
+            category['tasks'].sort(key=lambda x: x.get('id', 0))
+        
+        write_dashboard(db, transaction, categories, old_shards)
+    
+    apply(db.transaction())
+    inflight_reads.invalidate()
 
 class Handler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
@@ -43,6 +352,10 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         """Handle POST requests for admin operations"""
         if self.path == '/api/tasks':
             self.handle_add_task()
+        elif self.path == '/api/dashboard/rebuild':
+            self.handle_rebuild_dashboard()
+        elif self.path == '/api/archive/run':
+            self.handle_run_archive()
         else:
             super().do_POST()
 
@@ -62,11 +375,16 @@ class Handler(http.server.SimpleHTTPRequestHandler):
 
     def do_GET(self):
         """Handle GET requests including admin endpoints"""
-        if self.path == '/api/tasks':
-            self.handle_get_all_tasks()
-        elif self.path == '/api/categories':
+        parsed = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        if parsed.path == '/api/tasks':
+            include_archived = query.get('include_archived', ['false'])[0].lower() in ('1', 'true', 'yes')
+            self.handle_get_all_tasks(include_archived)
+        elif parsed.path == '/api/archive':
+            self.handle_get_archive(query.get('month', [None])[0])
+        elif parsed.path == '/api/categories':
             self.handle_get_categories()
-        elif self.path == '/api/migrate':
+        elif parsed.path == '/api/migrate':
             self.handle_migration()
         else:
             super().do_GET()
@@ -74,53 +392,13 @@ class Handler(http.server.SimpleHTTPRequestHandler):
     def get_categories_from_firestore(self):
         """Get all categories and their tasks from Firestore"""
         try:
-            print("Getting categories from Firestore...")
-            categories = {}
-            
-            # Get all categories with timeout protection
-            categories_ref = self.db.collection('categories')
-            category_docs = list(categories_ref.stream())
-            print(f"Found {len(category_docs)} categories")
-            
-            # Get all tasks at once (more efficient)
-            tasks_ref = self.db.collection('tasks')
-            all_task_docs = list(tasks_ref.stream())
-            print(f"Found {len(all_task_docs)} tasks")
-            
-            # Group tasks by category
-            tasks_by_category = {}
-            for task_doc in all_task_docs:
-                task_data = task_doc.to_dict()
-                task_data['id'] = int(task_doc.id)  # Ensure ID is integer
-                
-                # Remove Firestore timestamps that can't be JSON serialized
-                task_data.pop('created_at', None)
-                task_data.pop('updated_at', None)
-                
-                category = task_data.get('category', 'Unknown')
-                
-                if category not in tasks_by_category:
-                    tasks_by_category[category] = []
-                tasks_by_category[category].append(task_data)
-            
-            # Build categories structure
-            for category_doc in category_docs:
-                category_data = category_doc.to_dict()
-                category_name = category_doc.id
-                
-                # Get tasks for this category
-                tasks = tasks_by_category.get(category_name, [])
-                
-                # Sort tasks by ID
-                tasks.sort(key=lambda x: x.get('id', 0))
-                
-                categories[category_name] = {
-                    'color': category_data.get('color', '#666666'),
-                    'tasks': tasks
-                }
-            
-            print(f"Successfully built {len(categories)} categories")
-            return categories
+            if MATERIALIZED_DASHBOARD:
+                categories = read_dashboard(self.db)[0]
+                if categories is None:
+                    print("Dashboard document missing, rebuilding")
+                    categories = rebuild_dashboard(self.db)
+                return categories
+            return fetch_categories(self.db)
             
         except Exception as e:
             print(f"Error getting categories from Firestore: {e}")
@@ -183,47 +461,57 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             
             # Commit the batch
             batch.commit()
+            reset_dashboard(self.db)
             print("Migration completed successfully!")
             
         except Exception as e:
             print(f"Error during migration: {e}")
 
+    def get_categories_coalesced(self):
+        """Get categories, sharing the Firestore fetch with concurrent requests"""
+        return inflight_reads.do('categories:data', self.get_categories_from_firestore)
+
+    def build_categories_response(self):
+        """Build the encoded /api/categories payload"""
+        categories = self.get_categories_coalesced()
+        
+        # If Firestore fails, try JSON file as fallback
+        if not categories:
+            print("Firestore returned empty, trying JSON fallback")
+            categories = self.load_config_from_json()
+        
+        # If still empty, create a minimal structure to prevent errors
+        if not categories:
+            print("No data found, creating minimal structure")
+            categories = {
+                "No Data": {
+                    "color": "#666666",
+                    "tasks": [{
+                        "id": 1,
+                        "title": "Migration needed",
+                        "description": "Run /api/migrate to import your data",
+                        "priority": "high",
+                        "status": "Open"
+                    }]
+                }
+            }
+        
+        config = {"categories": categories}
+        print(f"Serving config with {len(categories)} categories")
+        return json.dumps(config, ensure_ascii=False).encode('utf-8')
+
     def handle_get_categories(self):
         """API endpoint to get all categories with their tasks from Firestore"""
         try:
             print("Starting handle_get_categories")
-            categories = self.get_categories_from_firestore()
-            
-            # If Firestore fails, try JSON file as fallback
-            if not categories:
-                print("Firestore returned empty, trying JSON fallback")
-                categories = self.load_config_from_json()
-            
-            # If still empty, create a minimal structure to prevent errors
-            if not categories:
-                print("No data found, creating minimal structure")
-                categories = {
-                    "No Data": {
-                        "color": "#666666",
-                        "tasks": [{
-                            "id": 1,
-                            "title": "Migration needed",
-                            "description": "Run /api/migrate to import your data",
-                            "priority": "high",
-                            "status": "Open"
-                        }]
-                    }
-                }
-            
-            config = {"categories": categories}
-            print(f"Serving config with {len(categories)} categories")
+            body = inflight_reads.do('categories:response', self.build_categories_response)
             
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.send_header('Cache-Control', 'no-cache')
             self.end_headers()
             
-            self.wfile.write(json.dumps(config, ensure_ascii=False).encode('utf-8'))
+            self.wfile.write(body)
             
         except Exception as e:
             print(f"Error serving config JSON: {e}")
@@ -307,6 +595,7 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             
             # Commit the batch
             batch.commit()
+            reset_dashboard(self.db)
             
             self.send_json_response({
                 'success': True,
@@ -323,12 +612,34 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 'error': str(e)
             }, 500)
 
+    def handle_rebuild_dashboard(self):
+        """Rebuild the materialized dashboard document via HTTP"""
+        try:
+            categories = rebuild_dashboard(self.db)
+            self.send_json_response({"success": True, "categories": len(categories)})
+        except Exception as e:
+            print(f"Error rebuilding dashboard: {e}")
+            self.send_json_response({"error": "Failed to rebuild dashboard"}, 500)
+
+    def handle_run_archive(self):
+        """Run the archive job now (e.g. from Cloud Scheduler)"""
+        try:
+            archived = archive_closed_tasks(self.db)
+            self.send_json_response({"success": True, "archived": archived})
+        except Exception as e:
+            print(f"Error archiving tasks: {e}")
+            self.send_json_response({"error": "Failed to archive tasks"}, 500)
+
     def send_json_response(self, data, status=200):
         """Send a JSON response"""
+        self.send_encoded_json(json.dumps(data, ensure_ascii=False).encode('utf-8'), status)
+
+    def send_encoded_json(self, body, status=200):
+        """Send an already-encoded JSON response body"""
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        self.wfile.write(body)
 
     def get_request_body(self):
         """Get and parse the request body as JSON"""
@@ -343,43 +654,74 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             print(f"Error parsing request body: {e}")
             return {}
 
-    def handle_get_all_tasks(self):
-        """Get all tasks in a flat structure for admin table"""
-        try:
-            tasks = []
+    def build_all_tasks_response(self, include_archived=False):
+        """Build the encoded /api/tasks payload"""
+        tasks = []
+        
+        # Get all active tasks from Firestore
+        tasks_ref = self.db.collection('tasks')
+        task_docs = list(tasks_ref.stream())
+        
+        # Archived tasks live in per-month subcollections
+        if include_archived:
+            task_docs.extend(self.db.collection_group('archived_tasks').stream())
+        
+        # Get category colors
+        categories = self.get_categories_coalesced()
+        
+        for task_doc in task_docs:
+            task_data = task_from_doc(task_doc)
+            if include_archived:
+                task_data['archived'] = task_doc.reference.parent.id == 'archived_tasks'
             
-            # Get all tasks from Firestore
-            tasks_ref = self.db.collection('tasks')
-            task_docs = tasks_ref.stream()
+            # Add category color
+            category_name = task_data.get('category', '')
+            category_color = '#666666'
+            if category_name in categories:
+                category_color = categories[category_name].get('color', '#666666')
             
-            # Get category colors
-            categories = self.get_categories_from_firestore()
+            task_data['categoryColor'] = category_color
+            tasks.append(task_data)
+        
+        # Sort by ID
+        tasks.sort(key=lambda x: x.get('id', 0))
+        
+        return json.dumps({"tasks": tasks}, ensure_ascii=False).encode('utf-8')
+
+    def handle_get_all_tasks(self, include_archived=False):
+        """Get all tasks in a flat structure for admin table"""
+        try:
+            body = inflight_reads.do(
+                f'tasks:response:{include_archived}',
+                lambda: self.build_all_tasks_response(include_archived)
+            )
+            self.send_encoded_json(body)
             
-            for task_doc in task_docs:
-                task_data = task_doc.to_dict()
-                task_data['id'] = int(task_doc.id)
-                
-                # Remove Firestore timestamps that can't be JSON serialized
-                task_data.pop('created_at', None)
-                task_data.pop('updated_at', None)
-                
-                # Add category color
-                category_name = task_data.get('category', '')
-                category_color = '#666666'
-                if category_name in categories:
-                    category_color = categories[category_name].get('color', '#666666')
-                
-                task_data['categoryColor'] = category_color
-                tasks.append(task_data)
+        except Exception as e:
+            print(f"Error getting all tasks: {e}")
+            self.send_json_response({"error": "Failed to load tasks"}, 500)
+
+    def handle_get_archive(self, month=None):
+        """Get archived tasks, optionally limited to one month (YYYY-MM)"""
+        if month is not None and not re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', month):
+            self.send_json_response({"error": "month must be in YYYY-MM format"}, 400)
+            return
+        
+        try:
+            if month:
+                archived_ref = self.db.collection('archive').document(month).collection('archived_tasks')
+            else:
+                archived_ref = self.db.collection_group('archived_tasks')
             
-            # Sort by ID
+            tasks = [task_from_doc(task_doc) for task_doc in archived_ref.stream()]
             tasks.sort(key=lambda x: x.get('id', 0))
             
-            self.send_json_response({"tasks": tasks})
+            months = sorted(month_doc.id for month_doc in self.db.collection('archive').stream())
+            self.send_json_response({"months": months, "tasks": tasks})
             
         except Exception as e:
-            print(f"Error getting all tasks: {e}")
-            self.send_json_response({"error": "Failed to load tasks"}, 500)
+            print(f"Error getting archived tasks: {e}")
+            self.send_json_response({"error": "Failed to load archived tasks"}, 500)
 
     def handle_add_task(self):
         """Add a new task"""
@@ -394,7 +736,8 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             # Check if category exists
             category = data["category"]
             category_ref = self.db.collection('categories').document(category)
-            if not category_ref.get().exists:
+            category_doc = category_ref.get()
+            if not category_doc.exists:
                 self.send_json_response({"error": "Category does not exist"}, 400)
                 return
 
@@ -409,6 +752,10 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 except ValueError:
                     continue
             
+            # Archived tasks keep their IDs, so never hand those out again
+            for month_doc in self.db.collection('archive').stream():
+                max_id = max(max_id, month_doc.to_dict().get('max_task_id', 0))
+            
             new_id = max_id + 1
 
             # Create new task
@@ -421,10 +768,25 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 "created_at": firestore.SERVER_TIMESTAMP,
                 "updated_at": firestore.SERVER_TIMESTAMP
             }
+            if new_task_data["status"] in TERMINAL_STATUSES:
+                new_task_data["closed_at"] = firestore.SERVER_TIMESTAMP
 
-            # Save to Firestore
-            task_ref = self.db.collection('tasks').document(str(new_id))
-            task_ref.set(new_task_data)
+            # Save to Firestore; a concurrent add may have taken this ID, so move on to the next
+            for attempt in range(ADD_TASK_MAX_ATTEMPTS):
+                task_ref = self.db.collection('tasks').document(str(new_id))
+                try:
+                    write_task(self.db, task_ref, set_data=new_task_data,
+                               color=category_doc.to_dict().get('color', '#666666'))
+                    break
+                except AlreadyExists:
+                    new_id += 1
+                except ValueError as e:
+                    # Raised by split_dashboard for a task that can't fit in any shard
+                    self.send_json_response({"error": str(e)}, 400)
+                    return
+            else:
+                self.send_json_response({"error": "Could not allocate a task ID, try again"}, 409)
+                return
 
             # Return the created task (without timestamps for JSON compatibility)
             response_task = {
@@ -461,13 +823,27 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             # Get task reference
             task_ref = self.db.collection('tasks').document(task_id)
             task_doc = task_ref.get()
+            archived_doc = None
             
             if not task_doc.exists:
-                self.send_json_response({"error": "Task not found"}, 404)
-                return
+                archived_doc = find_archived_task(self.db, task_id)
+                if archived_doc is None:
+                    self.send_json_response({"error": "Task not found"}, 404)
+                    return
+                # Reopening moves an archived task back into the active set; other edits stay in the archive
+                if "status" in data and data["status"] not in TERMINAL_STATUSES:
+                    restore_archived_task(self.db, task_id, archived_doc)
+                    archived_doc = None
+                    task_doc = task_ref.get()
+                    if not task_doc.exists:
+                        self.send_json_response({"error": "Task not found"}, 404)
+                        return
+            
+            current_doc = archived_doc or task_doc
 
             # Update task data
             update_data = {"updated_at": firestore.SERVER_TIMESTAMP}
+            category_color = '#666666'
             
             if "title" in data:
                 update_data["title"] = data["title"]
@@ -477,14 +853,35 @@ class Handler(http.server.SimpleHTTPRequestHandler):
                 update_data["priority"] = data["priority"]
             if "status" in data:
                 update_data["status"] = data["status"]
+                # Track when a task was closed so the archive job can age it out
+                was_closed = current_doc.to_dict().get('status') in TERMINAL_STATUSES
+                if data["status"] in TERMINAL_STATUSES:
+                    if not was_closed:
+                        update_data["closed_at"] = firestore.SERVER_TIMESTAMP
+                else:
+                    update_data["closed_at"] = firestore.DELETE_FIELD
             if "category" in data:
                 # Verify new category exists
                 category_ref = self.db.collection('categories').document(data["category"])
-                if category_ref.get().exists:
+                category_doc = category_ref.get()
+                if category_doc.exists:
                     update_data["category"] = data["category"]
+                    category_color = category_doc.to_dict().get('color', '#666666')
 
             # Update in Firestore
-            task_ref.update(update_data)
+            try:
+                if archived_doc is not None:
+                    archived_doc.reference.update(update_data)
+                    inflight_reads.invalidate()
+                else:
+                    write_task(self.db, task_ref, update_data=update_data, color=category_color)
+            except NotFound:
+                self.send_json_response({"error": "Task not found"}, 404)
+                return
+            except ValueError as e:
+                # Raised by split_dashboard for a task that can't fit in any shard
+                self.send_json_response({"error": str(e)}, 400)
+                return
             
             self.send_json_response({"success": True})
 
@@ -512,11 +909,18 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             task_doc = task_ref.get()
             
             if not task_doc.exists:
-                self.send_json_response({"error": "Task not found"}, 404)
+                archived_doc = find_archived_task(self.db, task_id)
+                if archived_doc is None:
+                    self.send_json_response({"error": "Task not found"}, 404)
+                    return
+                # Archived tasks are not on the dashboard, so only the archive copy goes
+                archived_doc.reference.delete()
+                inflight_reads.invalidate()
+                self.send_json_response({"success": True})
                 return
 
             # Delete from Firestore
-            task_ref.delete()
+            write_task(self.db, task_ref, delete=True)
             
             self.send_json_response({"success": True})
 
@@ -524,6 +928,206 @@ class Handler(http.server.SimpleHTTPRequestHandler):
             print(f"Error deleting task: {e}")
             self.send_json_response({"error": "Failed to delete task"}, 500)
 
+def archive_closed_tasks(db, max_age_days=ARCHIVE_AFTER_DAYS):
+    """Move tasks closed for longer than max_age_days into archive/{YYYY-MM}/archived_tasks"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    archive_ref = db.collection('archive')
+    
+    # Tasks closed before closed_at was tracked fall back to updated_at
+    candidates = []
+    for task_doc in db.collection('tasks').where(filter=FieldFilter('status', 'in', TERMINAL_STATUSES)).stream():
+        task_data = task_doc.to_dict()
+        closed_at = task_data.get('closed_at') or task_data.get('updated_at')
+        if closed_at is not None and closed_at < cutoff:
+            candidates.append((task_doc, task_data, closed_at.strftime('%Y-%m')))
+    
+    if not candidates:
+        return 0
+    
+    print(f"📦 Archiving {len(candidates)} tasks closed before {cutoff:%Y-%m-%d}")
+    max_ids = {}
+    archived = 0
+    
+    for start in range(0, len(candidates), ARCHIVE_BATCH_SIZE):
+        chunk = candidates[start:start + ARCHIVE_BATCH_SIZE]
+        batch = db.batch()
+        
+        for task_doc, task_data, month in chunk:
+            if month not in max_ids:
+                month_doc = archive_ref.document(month).get()
+                max_ids[month] = month_doc.to_dict().get('max_task_id', 0) if month_doc.exists else 0
+            try:
+                max_ids[month] = max(max_ids[month], int(task_doc.id))
+            except ValueError:
+                pass
+            
+            task_data['archived_at'] = firestore.SERVER_TIMESTAMP
+            batch.set(archive_ref.document(month).collection('archived_tasks').document(task_doc.id), task_data)
+            # Fails the chunk if the task was edited (e.g. reopened) since we read it
+            batch.delete(task_doc.reference, option=db.write_option(last_update_time=task_doc.update_time))
+        
+        for month in {month for _, _, month in chunk}:
+            batch.set(archive_ref.document(month), {
+                'max_task_id': max_ids[month],
+                'updated_at': firestore.SERVER_TIMESTAMP
+            }, merge=True)
+        
+        try:
+            batch.commit()
+            archived += len(chunk)
+        except Exception as e:
+            print(f"⚠️  Skipping archive chunk, will retry next run: {e}")
+    
+    print(f"📦 Archived {archived} tasks")
+    if archived:
+        inflight_reads.invalidate()
+    
+    # Archived tasks leave the active set, so drop them from the dashboard document
+    if archived:
+        if MATERIALIZED_DASHBOARD:
+            rebuild_dashboard(db)
+        else:
+            reset_dashboard(db)
+    return archived
+
+def find_archived_task(db, task_id):
+    """Find an archived task by ID across all archive months; returns its snapshot or None"""
+    archive_ref = db.collection('archive')
+    refs = [archive_ref.document(month_doc.id).collection('archived_tasks').document(task_id)
+            for month_doc in archive_ref.stream()]
+    if not refs:
+        return None
+    for task_doc in db.get_all(refs):
+        if task_doc.exists:
+            return task_doc
+    return None
+
+def restore_archived_task(db, task_id, archived_doc=None):
+    """Move an archived task back into the tasks collection; returns False if it isn't archived"""
+    if archived_doc is None:
+        archived_doc = find_archived_task(db, task_id)
+    if archived_doc is None:
+        return False
+    
+    task_data = archived_doc.to_dict()
+    task_data.pop('archived_at', None)
+    
+    batch = db.batch()
+    batch.create(db.collection('tasks').document(task_id), task_data)
+    batch.delete(archived_doc.reference)
+    try:
+        batch.commit()
+    except AlreadyExists:
+        # A concurrent request restored it first
+        return True
+    inflight_reads.invalidate()
+    print(f"📦 Restored task {task_id} from the archive")
+    return True
+
+def run_archive_job(interval):
+    """Periodically archive old closed tasks in a background thread"""
+    def loop():
+        while True:
+            # Wait first so the job never competes with a cold start
+            time.sleep(interval)
+            try:
+                archive_closed_tasks(firestore.Client())
+            except Exception as e:
+                print(f"⚠️  Archive job failed: {e}")
+    
+    thread = threading.Thread(target=loop, name='archive-job', daemon=True)
+    thread.start()
+    return thread
+
+class ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """TCP server handling each request in its own thread"""
+    daemon_threads = True
+
+class ReusePortTCPServer(ThreadingServer):
+    """Threaded TCP server that lets several worker processes bind the same port"""
+    allow_reuse_address = True
+    # Let server_close() wait for in-flight requests when a worker shuts down
+    daemon_threads = False
+
+    def server_bind(self):
+        # SO_REUSEPORT lets the kernel load-balance connections across workers
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+def run_worker(worker_id, generation):
+    """Serve requests in a prefork worker process"""
+    inflight_reads.share_generation(generation)
+    # The supervisor handles Ctrl+C; workers exit when it terminates them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    with ReusePortTCPServer(("0.0.0.0", PORT), Handler) as httpd:
+        # shutdown() blocks until serve_forever returns, so it can't run in the signal handler
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=httpd.shutdown).start())
+        print(f"👷 Worker {worker_id} (pid {os.getpid()}) listening on port {PORT}")
+        httpd.serve_forever()
+
+def run_prefork(workers, generation):
+    """Start worker processes and restart any that exit unexpectedly"""
+    # Spawn (not fork) so each worker opens its own Firestore/gRPC connections
+    ctx = multiprocessing.get_context('spawn')
+    processes = {}
+    started_at = {}
+    failures = {worker_id: 0 for worker_id in range(workers)}
+    restart_at = {}
+
+    def start_worker(worker_id):
+        process = ctx.Process(target=run_worker, args=(worker_id, generation), daemon=True)
+        process.start()
+        processes[worker_id] = process
+        started_at[worker_id] = time.monotonic()
+
+    def stop_workers():
+        running = [process for process in processes.values() if process is not None]
+        for process in running:
+            process.terminate()
+        for process in running:
+            process.join(timeout=8)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Cloud Run sends SIGTERM on shutdown
+    signal.signal(signal.SIGTERM, stop)
+
+    for worker_id in range(workers):
+        start_worker(worker_id)
+
+    try:
+        while True:
+            time.sleep(1)
+            now = time.monotonic()
+            for worker_id, process in list(processes.items()):
+                if process is None:
+                    if now >= restart_at[worker_id]:
+                        start_worker(worker_id)
+                    continue
+                if process.is_alive():
+                    continue
+                
+                # Back off on workers that die right after starting (e.g. bind failures)
+                if now - started_at[worker_id] < WORKER_MIN_UPTIME_SECONDS:
+                    failures[worker_id] += 1
+                else:
+                    failures[worker_id] = 0
+                if failures[worker_id] >= WORKER_MAX_RAPID_FAILURES:
+                    print(f"❌ Worker {worker_id} keeps exiting right after start (code {process.exitcode}), giving up")
+                    stop_workers()
+                    sys.exit(1)
+                
+                delay = min(2 ** failures[worker_id], 60)
+                print(f"⚠️  Worker {worker_id} exited with code {process.exitcode}, restarting in {delay}s")
+                processes[worker_id] = None
+                restart_at[worker_id] = now + delay
+    except KeyboardInterrupt:
+        print("\n👋 Stopping workers...")
+        stop_workers()
+        print("👋 Server stopped")
+
 def main():
     # Change to the directory containing this script
     script_dir = Path(__file__).parent
@@ -551,36 +1155,60 @@ def main():
         print(f"⚠️  Warning: Could not connect to Firestore: {e}")
         print("📝 Make sure you're authenticated with Google Cloud")
     
-    with socketserver.TCPServer(("0.0.0.0", PORT), Handler) as httpd:
-        # Get the local IP address for network access
-        import socket
-        hostname = socket.gethostname()
-        local_ip = socket.gethostbyname(hostname)
-        
-        print(f"🚀 Task Dashboard server running at:")
-        print(f"   📱 Local access: http://localhost:{PORT}")
-        print(f"   🌐 Network access: http://{local_ip}:{PORT}")
-        print(f"📁 Serving files from: {script_dir}")
-        print("💡 To stop the server, press Ctrl+C")
-        print()
-        print("🔥 Using Google Cloud Firestore for persistent data storage")
-        print("📝 Tasks will persist across deployments and server restarts")
-        print("🔧 Admin interface available for managing tasks")
-        print()
-        print("🏠 Other devices on your network can access via:")
-        print(f"   http://{local_ip}:{PORT}")
-        
-        # Only try to open browser in local development
-        if os.environ.get('PORT') is None:  # Local development
-            try:
-                webbrowser.open(f'http://localhost:{PORT}')
-            except:
-                pass
-        
+    # Get the local IP address for network access
+    hostname = socket.gethostname()
+    local_ip = socket.gethostbyname(hostname)
+    
+    print(f"🚀 Task Dashboard server running at:")
+    print(f"   📱 Local access: http://localhost:{PORT}")
+    print(f"   🌐 Network access: http://{local_ip}:{PORT}")
+    print(f"📁 Serving files from: {script_dir}")
+    print("💡 To stop the server, press Ctrl+C")
+    print()
+    print("🔥 Using Google Cloud Firestore for persistent data storage")
+    print("📝 Tasks will persist across deployments and server restarts")
+    print("🔧 Admin interface available for managing tasks")
+    print()
+    print("🏠 Other devices on your network can access via:")
+    print(f"   http://{local_ip}:{PORT}")
+    
+    # Only try to open browser in local development
+    if os.environ.get('PORT') is None:  # Local development
+        try:
+            webbrowser.open(f'http://localhost:{PORT}')
+        except:
+            pass
+    
+    prefork = WORKERS > 1 and hasattr(socket, 'SO_REUSEPORT')
+    if WORKERS > 1 and not prefork:
+        print("⚠️  SO_REUSEPORT not supported on this platform, running a single process")
+    
+    if prefork:
+        # Writes in any worker (or the supervisor's archive job) invalidate in-flight reads in every worker
+        generation = multiprocessing.get_context('spawn').Value('q', 0)
+        inflight_reads.share_generation(generation)
+    
+    # Runs once per instance (in the supervisor when preforking)
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        run_archive_job(ARCHIVE_INTERVAL_SECONDS)
+    
+    if prefork:
+        print(f"⚙️  Prefork mode: {WORKERS} worker processes")
+        run_prefork(WORKERS, generation)
+        return
+    
+    with ThreadingServer(("0.0.0.0", PORT), Handler) as httpd:
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n👋 Server stopped")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    if '--rebuild-dashboard' in sys.argv[1:]:
+        # Recovery: python server.py --rebuild-dashboard
+        rebuild_dashboard(firestore.Client())
+    elif '--archive' in sys.argv[1:]:
+        # One-off archive run: python server.py --archive
+        archive_closed_tasks(firestore.Client())
+    else:
+        main()
\ No newline at end of file
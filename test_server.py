@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pure helpers in server.py
+Run with: python -m unittest test_server
+"""
+
+import json
+import unittest
+from unittest import mock
+
+import server
+
+
+def make_categories(spec, title_size=100):
+    """Build a categories dict from {name: task_count}"""
+    categories = {}
+    next_id = 1
+    for name, count in spec.items():
+        tasks = []
+        for _ in range(count):
+            tasks.append({'id': next_id, 'title': 'x' * title_size, 'category': name})
+            next_id += 1
+        categories[name] = {'color': '#4CAF50', 'tasks': tasks}
+    return categories
+
+
+def merge_shards(shards):
+    """Merge shards back into a categories dict the way read_dashboard does"""
+    categories = {}
+    for shard in shards:
+        for entry in shard:
+            category = categories.setdefault(entry['name'], {'color': entry['color'], 'tasks': []})
+            category['tasks'].extend(entry['tasks'])
+    return categories
+
+
+class SplitDashboardTests(unittest.TestCase):
+    def split(self, categories, limit):
+        with mock.patch.object(server, 'DASHBOARD_SHARD_BYTES', limit):
+            return server.split_dashboard(categories)
+
+    def assert_shards_fit(self, shards, limit):
+        for shard in shards:
+            self.assertLessEqual(len(json.dumps(shard, ensure_ascii=False).encode('utf-8')), limit)
+
+    def test_empty_dashboard_is_one_empty_shard(self):
+        self.assertEqual(self.split({}, 1000), [[]])
+
+    def test_small_dashboard_fits_in_one_shard(self):
+        categories = make_categories({'Outdoor': 2, 'Indoor': 1})
+        shards = self.split(categories, 900 * 1024)
+        self.assertEqual(len(shards), 1)
+        self.assertEqual(merge_shards(shards), categories)
+
+    def test_shards_stay_under_limit(self):
+        categories = make_categories({'A': 9, 'B': 1, 'C': 4})
+        categories['B']['tasks'][0]['title'] = 'y' * 700
+        shards = self.split(categories, 1000)
+        self.assertGreater(len(shards), 1)
+        self.assert_shards_fit(shards, 1000)
+        self.assertEqual(merge_shards(shards), categories)
+
+    def test_many_small_categories_stay_under_limit(self):
+        categories = make_categories({f'Category {i}': 0 for i in range(50)})
+        shards = self.split(categories, 300)
+        self.assert_shards_fit(shards, 300)
+        self.assertEqual(merge_shards(shards), categories)
+
+    def test_no_header_only_entries_when_category_moves(self):
+        categories = make_categories({'A': 3, 'B': 2})
+        shards = self.split(categories, 400)
+        for shard in shards:
+            for entry in shard:
+                self.assertTrue(entry['tasks'])
+
+    def test_oversized_task_is_rejected(self):
+        categories = make_categories({'A': 1}, title_size=2000)
+        with self.assertRaises(ValueError):
+            self.split(categories, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()